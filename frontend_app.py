@@ -0,0 +1,876 @@
+"""
+Recommendation app — STANZA (Apple Music Version)
+=================================================
+Frontend for:
+- Choosing a vibe (task)
+- Asking backend for recommended tracks (student-seeded, Apple previews)
+- Letting user review + pick tracks
+- Creating an Apple Music playlist in the user’s library (via backend)
+
+Backend expectations (Apple version):
+-------------------------------------
+- GET  /vibes
+    -> { "vibes": ["focus", "creative", ...],
+         "details": { "focus": { "note": "...", ...}, ... } }  (details optional)
+
+- POST /apple/recommend
+    Body: {
+      "vibe": "focus",
+      "limit": 25,
+      "storefront": "us"
+    }
+    -> {
+      "ok": true,
+      "vibe": "focus",
+      "count": 25,
+      "tracks": [
+        {
+          "id": "apple_track_id",
+          "name": "Song Name",
+          "artist_name": "Artist Name",
+          "album_name": "Album",
+          "preview_url": "https://audio-preview-url.m4a",
+          "apple_music_url": "https://music.apple.com/...",
+          "features": { "tempo": ..., "energy": ..., ... },
+          "similarity": 0.87
+        }, ...
+      ]
+    }
+
+- POST /apple/recommend/stream
+    Same body as /apple/recommend; NDJSON response, one track object (as
+    above) per line in the order they are scored. The client ranks them by
+    "similarity" and keeps the top `limit`.
+
+- POST /apple/playlist
+    Body: {
+      "user_token": "<Apple Music user token>",
+      "storefront": "us",
+      "vibe": "focus",
+      "name": "Playlist name",
+      "description": "Playlist desc",
+      "track_ids": ["apple_track_id1", "apple_track_id2", ...]
+    }
+    -> { "ok": true, "playlist_id": "..." }  (or plus a URL if your backend returns it)
+"""
+
+import html
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Any
+from urllib.parse import urlencode, urlsplit
+
+import httpx
+import numpy as np
+import orjson
+import pandas as pd
+import streamlit as st
+
+from frontend_config import BACKEND_BASE_URL, DEBUG_PANEL, logo_svg
+
+TRACKS_PAGE_SIZE = 10  # track cards rendered per "Load more" page
+PREFETCH_DEBOUNCE_S = 0.3  # how long a (vibe, limit) must stay put before it's prefetched
+CONNECT_TIMEOUT_S = 5.0  # fail fast on an unreachable backend; read timeouts are per call
+MAX_RESPONSE_BYTES = 2 * 1024 * 1024  # a 25-track result is a few KB; anything near this is a bug
+
+# ------------------ Session State ------------------
+def init_state():
+    """Defaults for the app's session keys; safe to call on every run."""
+    if "vibes" not in st.session_state:
+        st.session_state.vibes = []
+    if "vibe_notes" not in st.session_state:
+        st.session_state.vibe_notes = {}  # vibe -> caption text, see fetch_vibes
+    if "tracks_soa" not in st.session_state:
+        st.session_state.tracks_soa = None  # recommended tracks as columns, see tracks_to_columns
+    if "sel_mask" not in st.session_state:
+        # Keep/drop per position in tracks_soa; replaced wholesale, never mutated
+        st.session_state.sel_mask = np.zeros(0, dtype=bool)
+    if "keep_all" not in st.session_state:
+        st.session_state.keep_all = True
+    if "editor_rev" not in st.session_state:
+        st.session_state.editor_rev = 0
+    if "rec_page" not in st.session_state:
+        st.session_state.rec_page = 1
+    if "pending_rec" not in st.session_state:
+        st.session_state.pending_rec = None  # Future for the prefetched /apple/recommend
+        st.session_state.pending_key = None  # (vibe, limit) that future was started for
+        st.session_state.wanted_key = None  # latest (vibe, limit) seen by prefetch_recommendations
+        st.session_state.wanted_ts = 0.0  # time.monotonic() when wanted_key last changed
+        st.session_state.pending_progress = []  # tracks streamed in so far for that future
+    if "last_playlist" not in st.session_state:
+        # ((name, track_ids), playlist_id, playlist_url) of the last playlist created
+        st.session_state.last_playlist = None
+
+# ------------------ Backend helpers ------------------
+
+@st.cache_resource
+def _client() -> httpx.Client:
+    """
+    One pooled HTTP/2 client per server process, shared across reruns and user
+    sessions, so backend calls reuse (and multiplex over) one TLS connection.
+    """
+    transport = httpx.HTTPTransport(
+        http2=True,
+        retries=2,  # connection failures only; 5xx retries are in _send
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=4),
+    )
+    return httpx.Client(transport=transport, timeout=httpx.Timeout(30.0, connect=CONNECT_TIMEOUT_S))
+
+
+@st.cache_resource
+def _executor() -> ThreadPoolExecutor:
+    """Background workers for speculative backend calls, shared per process."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="stanza-prefetch")
+
+
+@st.cache_resource
+def _ui_executor() -> ThreadPoolExecutor:
+    """
+    Workers for calls a user is actively waiting on, kept apart from _executor
+    so they never queue behind other sessions' speculative work.
+    """
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="stanza-ui")
+
+_ETAGS_MAXSIZE = 64
+_RETRY_STATUSES = (502, 503, 504)  # Render cold starts / restarts
+
+
+@st.cache_resource
+def _etags() -> "OrderedDict[str, tuple[str, Any]]":
+    """Last ETag + body per GET URL (LRU), so repeat fetches can be answered with a 304."""
+    return OrderedDict()
+
+
+@st.cache_resource
+def _etags_lock() -> threading.Lock:
+    """Guards _etags(): every session's script thread (and any worker thread) updates it."""
+    return threading.Lock()
+
+
+@st.cache_resource
+def _api_log() -> "deque[dict]":
+    """Recent backend calls across all sessions, for the debug panel (appends are thread-safe)."""
+    return deque(maxlen=200)
+
+
+@st.cache_resource
+def _cache_misses() -> Counter:
+    """Backend fetches per cached fetcher, i.e. its cache misses, for the debug panel."""
+    return Counter()
+
+
+def _send(request: httpx.Request, retry: bool, stream: bool = False) -> httpx.Response:
+    """
+    Send a request; if `retry` (idempotent calls only), resend on a gateway
+    error (Render cold starts / restarts) up to twice, with backoff.
+    """
+    for attempt in range(3):
+        t0 = time.perf_counter()
+        r = _client().send(request, stream=stream)
+        _api_log().append(
+            {
+                "at": time.strftime("%H:%M:%S"),
+                "call": f"{request.method} {request.url.path}",
+                "status": r.status_code,
+                "ms": round((time.perf_counter() - t0) * 1000),  # to headers, for streams
+                "attempt": attempt + 1,
+            }
+        )
+        if not retry or r.status_code not in _RETRY_STATUSES or attempt == 2:
+            return r
+        r.close()
+        time.sleep(0.3 * 2 ** attempt)
+
+
+def _read_body(r: httpx.Response, what: str) -> bytes:
+    """
+    Read a streamed response, giving up past MAX_RESPONSE_BYTES (counted after
+    gzip decoding) so a misbehaving backend can't balloon the server's memory.
+    """
+    try:
+        if int(r.headers.get("Content-Length") or 0) > MAX_RESPONSE_BYTES:
+            raise RuntimeError(f"{what} response too large")
+        body = bytearray()
+        for chunk in r.iter_bytes():
+            body += chunk
+            if len(body) > MAX_RESPONSE_BYTES:
+                raise RuntimeError(f"{what} response too large")
+        return bytes(body)
+    finally:
+        r.close()
+
+
+def api_get(path: str, params: dict | None = None, timeout: int = 20):
+    url = f"{BACKEND_BASE_URL}{path}"
+    cache_key = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+    etags, lock = _etags(), _etags_lock()
+    with lock:
+        cached = etags.get(cache_key)
+    headers = {"Accept": "application/json"}
+    if cached:
+        headers["If-None-Match"] = cached[0]
+
+    request = _client().build_request(
+        "GET", url, params=params, headers=headers, timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT_S)
+    )
+    r = _send(request, retry=True, stream=True)
+    body = _read_body(r, f"GET {path}")
+
+    if r.status_code == 304 and cached:
+        with lock:
+            if cache_key in etags:
+                etags.move_to_end(cache_key)
+        return cached[1]
+    if r.status_code >= 400:
+        raise RuntimeError(f"GET {path} failed: {r.status_code} {body.decode(errors='replace')}")
+
+    data = orjson.loads(body)
+    etag = r.headers.get("ETag")
+    if etag:
+        with lock:
+            etags[cache_key] = (etag, data)
+            etags.move_to_end(cache_key)
+            while len(etags) > _ETAGS_MAXSIZE:
+                etags.popitem(last=False)
+    return data
+
+def api_post(path: str, payload: dict, timeout: int = 120, retry: bool = False):
+    """POST JSON. Pass retry=True only for endpoints that are safe to repeat."""
+    url = f"{BACKEND_BASE_URL}{path}"
+    request = _client().build_request(
+        "POST",
+        url,
+        content=orjson.dumps(payload),
+        headers={"Content-Type": "application/json", "Accept": "application/json"},
+        timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT_S),
+    )
+    r = _send(request, retry=retry, stream=True)
+    body = _read_body(r, f"POST {path}")
+    if r.status_code >= 400:
+        raise RuntimeError(f"POST {path} failed: {r.status_code} {body.decode(errors='replace')}")
+    return orjson.loads(body)
+
+def api_post_lines(path: str, payload: dict, timeout: int = 120, retry: bool = False):
+    """
+    POST, then yield one decoded object per line of the NDJSON response as it
+    arrives. Retries (if enabled) only happen before the first line is read.
+    """
+    url = f"{BACKEND_BASE_URL}{path}"
+    request = _client().build_request(
+        "POST",
+        url,
+        content=orjson.dumps(payload),
+        headers={"Content-Type": "application/json", "Accept": "application/x-ndjson"},
+        timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT_S),
+    )
+    r = _send(request, retry=retry, stream=True)
+    try:
+        if r.status_code >= 400:
+            r.read()
+            raise RuntimeError(f"POST {path} failed: {r.status_code} {r.text}")
+        # Split lines off the raw (gzip-decoded) bytes, so the cap counts the
+        # same bytes _read_body does.
+        received = 0
+        buf = b""
+        for chunk in r.iter_bytes():
+            received += len(chunk)
+            if received > MAX_RESPONSE_BYTES:
+                raise RuntimeError(f"POST {path} response too large")
+            *lines, buf = (buf + chunk).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield orjson.loads(line)
+        if buf.strip():
+            yield orjson.loads(buf)
+    finally:
+        r.close()
+# ------------------ Data fetchers ------------------
+
+# Vibes are near-static (and "Refresh vibes" clears this), so cache for an hour.
+@st.cache_data(show_spinner=False, ttl=3600)
+def _fetch_vibes():
+    """
+    Returns (vibes, notes): the vibe names and a flat {vibe: note} map built
+    once here from the optional details, so reruns don't re-dig through it.
+    Raises if the backend is unavailable, so a failure is never cached.
+    """
+    _cache_misses()["fetch_vibes"] += 1
+    vib = api_get("/vibes")
+    vibes = vib.get("vibes", [])
+    details = vib.get("details") or {}
+    notes = {}
+    for v in vibes:
+        d = details.get(v) or {}
+        note = d.get("note") or d.get("description")
+        if note:
+            notes[v] = note
+    return vibes, notes
+
+
+DEFAULT_VIBES = ["focus", "creative", "mellow", "energetic"]
+
+
+def fetch_vibes():
+    """
+    (vibes, notes, ok): _fetch_vibes, or the default list with ok=False if the
+    backend isn't ready, so callers can avoid keeping the fallback.
+    """
+    try:
+        return (*_fetch_vibes(), True)
+    except Exception:
+        # Fallback if backend not ready
+        return DEFAULT_VIBES, {}, False
+
+# Bounded: each entry is up to 25 tracks, and (vibe, limit) has few combinations
+# per vibe, so 64 covers normal use without letting memory grow unchecked.
+@st.cache_data(show_spinner=False, ttl=600, max_entries=64)
+def fetch_recommendations(vibe: str, limit: int, storefront: str = "us", _progress: list | None = None) -> list:
+    """
+    Top `limit` tracks for the vibe, best first. On a cache miss the tracks are
+    streamed and each one is also appended to `_progress` as it arrives, so the
+    UI thread can show them while the rest are still being scored. (Leading
+    underscore: not part of the cache key.)
+    """
+    _cache_misses()["fetch_recommendations"] += 1
+    payload = {
+        "vibe": vibe,
+        "limit": limit,
+        "storefront": storefront,  # adjust if you support other storefronts
+    }
+    # 🔴 IMPORTANT: use Apple endpoint, not /recommend
+    tracks = []
+    # Read-only on the backend, so safe to retry on a cold-start 502/503/504.
+    for t in api_post_lines("/apple/recommend/stream", payload, retry=True):
+        tracks.append(t)
+        if _progress is not None:
+            _progress.append(t)
+    tracks.sort(key=lambda t: t.get("similarity") or 0.0, reverse=True)
+    return tracks[:limit]
+
+
+METRIC_KEYS = ("tempo", "energy", "zcr", "centroid", "bandwidth")
+
+
+def _metrics_line(features: dict) -> str:
+    """e.g. 'Tempo: 117.45 • Energy: 0.12' for the numeric features present."""
+    return " • ".join(
+        f"{key.capitalize()}: {features[key]:.2f}"
+        for key in METRIC_KEYS
+        if isinstance(features.get(key), (int, float))
+    )
+
+
+def tracks_to_columns(tracks: list) -> dict:
+    """
+    One pass over the /apple/recommend tracks into parallel lists (ids, names, ...),
+    with display fallbacks applied, so reruns index by position instead of
+    re-walking the track dicts. Each track's card HTML is built here too, once
+    per result set rather than on every tracks_table rerun, along with
+    preconnect hints for the artwork hosts those cards use.
+    """
+    soa = {
+        "ids": [t.get("id") for t in tracks],
+        "names": [t.get("name") or "Unknown Title" for t in tracks],
+        "artists": [t.get("artist_name") or "Unknown Artist" for t in tracks],
+        "albums": [t.get("album_name") or "" for t in tracks],
+        "artworks": [t.get("artwork_url") or "" for t in tracks],
+        "previews": [t.get("preview_url") for t in tracks],
+        "links": [t.get("apple_music_url") or t.get("apple_url") or t.get("external_url") for t in tracks],
+        "metrics": [_metrics_line(t.get("features") or {}) for t in tracks],
+    }
+    soa["cards"] = [_card_html(soa, i) for i in range(len(tracks))]
+    soa["preconnect"] = _preconnect_html(soa["artworks"])
+    return soa
+
+
+def _preconnect_html(urls: list) -> str:
+    """
+    preconnect/dns-prefetch links for each distinct host in `urls`. Apple
+    spreads artwork across is1-ssl ... is5-ssl.mzstatic.com, so the hosts are
+    read off the actual results instead of guessed.
+    """
+    hosts = dict.fromkeys(
+        f"{parts.scheme}://{parts.netloc}" for parts in map(urlsplit, urls) if parts.netloc
+    )
+    return "".join(
+        f'<link rel="preconnect" href="{html.escape(h)}"><link rel="dns-prefetch" href="{html.escape(h)}">'
+        for h in hosts
+    )
+
+
+def _submit_recommendations(vibe: str, limit: int, pool: ThreadPoolExecutor):
+    """Run fetch_recommendations on `pool` and track it as the pending request."""
+    progress: list = []
+    st.session_state.pending_rec = pool.submit(fetch_recommendations, vibe, limit, "us", progress)
+    st.session_state.pending_key = (vibe, limit)
+    st.session_state.pending_progress = progress
+    return st.session_state.pending_rec
+
+
+def _failed(future) -> bool:
+    """True for a future that finished by raising (not one that was cancelled)."""
+    return future.done() and not future.cancelled() and future.exception() is not None
+
+
+def prefetch_recommendations(vibe: str, limit: int):
+    """
+    Start /apple/recommend for the current (vibe, limit) in the background so
+    the result is usually ready by the time RECOMMEND is clicked.
+    """
+    key = (vibe, limit)
+    if st.session_state.pending_rec is not None and _failed(st.session_state.pending_rec):
+        # Forget a prefetch that failed in the background, so the key is tried
+        # again instead of its stale error being shown on the next click.
+        st.session_state.pending_rec = None
+        st.session_state.pending_key = None
+    if st.session_state.pending_key == key:
+        return
+
+    # Rapid changes (slider ticks, quick re-picks) rerun the script each time;
+    # only a value that has settled is worth a backend call. A new value starts
+    # the clock and is submitted once it's been left alone for
+    # PREFETCH_DEBOUNCE_S (vibe_controls re-checks on a timer). If the user
+    # clicks before then, RECOMMEND submits the request itself.
+    now = time.monotonic()
+    if st.session_state.wanted_key != key:
+        st.session_state.wanted_key = key
+        st.session_state.wanted_ts = now
+        return
+    if now - st.session_state.wanted_ts < PREFETCH_DEBOUNCE_S:
+        return
+
+    pending = st.session_state.pending_rec
+    # A started job can't be cancelled, so each session gets at most one
+    # running on the shared pool; a burst of changes must not fill it.
+    if pending is not None and pending.running():
+        return
+    if pending is not None:
+        pending.cancel()  # still queued, so this drops it
+
+    _submit_recommendations(vibe, limit, _executor())
+
+
+def _prefetch_tick(vibe: str, limit: int):
+    """
+    prefetch_recommendations as a timed fragment. Once the key is submitted
+    (here or by RECOMMEND), a fragment rerun forces one full rerun: that
+    re-creates the fragment without run_every, so an idle tab stops ticking.
+    """
+    prefetch_recommendations(vibe, limit)
+    if st.session_state.pending_key == (vibe, limit) and not st.session_state.get("prefetch_inline"):
+        st.rerun(scope="app")
+
+# ------------------ UI Blocks ------------------
+
+
+
+def _refresh_vibes():
+    """
+    Drop the cached /vibes (for every session) and this session's copy; the
+    next run refetches. The ETag store still turns an unchanged list into a 304.
+    """
+    _fetch_vibes.clear()
+    st.session_state.vibes = []
+    st.session_state.vibe_notes = {}
+    st.session_state.pop("init_future", None)
+    st.session_state.pop("vibes_fallback", None)  # an explicit refresh waits for the answer
+
+
+def _vibes_future():
+    """This session's background /vibes fetch, submitted to the UI pool if there isn't one."""
+    if "init_future" not in st.session_state:
+        st.session_state.init_future = _ui_executor().submit(fetch_vibes)
+    return st.session_state.init_future
+
+
+def vibe_controls():
+    st.subheader("1) Choose your vibe (task)")
+    if not st.session_state.vibes:
+        # Only the first render waits for /vibes; once the defaults have been
+        # shown, later runs just check whether the retry has landed.
+        wait_s = 0 if st.session_state.get("vibes_fallback") else 30
+        init = _vibes_future()
+        try:
+            vibes, notes, ok = init.result(timeout=wait_s)
+        except FutureTimeout:
+            # Still running: keep the future and pick it up on a later run.
+            vibes, notes, ok = DEFAULT_VIBES, {}, None
+        if ok:
+            st.session_state.vibes = vibes
+            st.session_state.vibe_notes = notes
+        else:
+            # Show the defaults for now, but don't keep them.
+            st.session_state.vibes_fallback = True
+            if ok is False:
+                # Answered with the fallback: the next run resubmits.
+                st.session_state.pop("init_future", None)
+    else:
+        vibes, notes = st.session_state.vibes, st.session_state.vibe_notes
+
+    c1, c2 = st.columns([0.5, 0.5])
+    with c1:
+        vibe = st.selectbox(
+            "Vibe",
+            options=vibes,
+            index=0,
+            help="Pick the task/mode you’re in (e.g., focus, creative, mellow).",
+        )
+    with c2:
+        limit = st.slider(
+            "Number of tracks",
+            min_value=5,
+            max_value=25,
+            value=10,
+            step=1,
+            help="How many songs you want in your recommendation batch.",
+        )
+
+    note = notes.get(vibe)
+    if note:
+        st.caption(note)
+    st.button("🔄 Refresh vibes", key="btn_refresh_vibes", on_click=_refresh_vibes)
+
+    # As a fragment on a timer until this (vibe, limit) is submitted, so a value
+    # that settles with no further interaction still gets prefetched. The flag
+    # marks the inline call of a full run, where _prefetch_tick must not rerun
+    # the app (that would drop this run's button clicks).
+    waiting = st.session_state.pending_key != (vibe, limit)
+    st.session_state.prefetch_inline = True
+    st.fragment(_prefetch_tick, run_every=PREFETCH_DEBOUNCE_S if waiting else None)(vibe, limit)
+    st.session_state.prefetch_inline = False
+    return vibe, limit
+
+
+def _forget_recommendations(vibe: str, limit: int):
+    """
+    Drop the cached /apple/recommend result for this (vibe, limit) only (other
+    sessions keep theirs) and any prefetch, so the next request asks again.
+    """
+    fetch_recommendations.clear(vibe, limit, "us")
+    if st.session_state.pending_rec is not None:
+        st.session_state.pending_rec.cancel()
+    st.session_state.pending_rec = None
+    st.session_state.pending_key = None
+
+
+def recommend_action(vibe: str, limit: int):
+    st.subheader("2) Get recommendations")
+
+    # Identical (vibe, limit) requests are served from fetch_recommendations'
+    # cache; "Fresh results" drops it first and asks the backend again.
+    c1, c2 = st.columns([0.8, 0.2])
+    with c1:
+        btn = st.button("✨ RECOMMEND TRACKS", type="primary", use_container_width=True)
+    with c2:
+        fresh = st.button(
+            "🔄 Fresh results",
+            use_container_width=True,
+            on_click=_forget_recommendations,
+            args=(vibe, limit),
+        )
+    if not (btn or fresh):
+        return
+
+    with st.status("🎵 Analyzing student tracks and finding similar Apple Music songs...") as status:
+        try:
+            pending = st.session_state.pending_rec
+            # A prefetch still queued behind other sessions' jobs is moved to
+            # the UI pool rather than waited on; a failed one is retried.
+            if (
+                pending is None
+                or st.session_state.pending_key != (vibe, limit)
+                or pending.cancel()
+                or pending.cancelled()
+                or _failed(pending)
+            ):
+                pending = _submit_recommendations(vibe, limit, _ui_executor())
+            # Usually already done via prefetch_recommendations; otherwise show
+            # the tracks as the backend streams them in.
+            progress = st.session_state.pending_progress
+            feed = st.empty()
+            deadline = time.monotonic() + 120
+            while not pending.done() and time.monotonic() < deadline:
+                wait([pending], timeout=0.25)
+                if progress:
+                    status.update(label=f"🎵 Scored {len(progress)} candidate tracks so far...")
+                    feed.markdown(_progress_html(progress, limit), unsafe_allow_html=True)
+            if not pending.done():
+                raise RuntimeError("the backend took more than 2 minutes to answer. Please try again.")
+            tracks = pending.result()
+            feed.empty()
+            soa = tracks_to_columns(tracks)
+            st.session_state.tracks_soa = soa
+            st.session_state.sel_mask = np.ones(len(soa["ids"]), dtype=bool)
+            st.session_state.keep_all = True
+            st.session_state.editor_rev += 1
+            st.session_state.rec_page = 1
+            if tracks:
+                status.update(label=f"🎉 Got {len(tracks)} recommended tracks for “{vibe}”.", state="complete")
+            else:
+                status.update(label="No tracks found. Try another vibe or a smaller limit.", state="error")
+        except Exception as e:
+            # Forget the failed prefetch so the next run starts a fresh request.
+            st.session_state.pending_rec = None
+            st.session_state.pending_key = None
+            status.update(label=f"❌ Recommendation failed: {e}", state="error")
+
+
+def _progress_html(progress: list, limit: int) -> str:
+    """
+    Cards for the best `limit` tracks streamed in so far, so early results can
+    be read (and previewed) while the rest are still being scored.
+    """
+    best = sorted(progress, key=lambda t: t.get("similarity") or 0.0, reverse=True)[:limit]
+    soa = tracks_to_columns(best)
+    return soa["preconnect"] + "".join(soa["cards"])
+
+
+def _card_html(soa: dict, i: int) -> str:
+    """Static HTML for track i's card: artwork, title/artist/album, metrics, link, audio."""
+    # Catalog text and URLs are escaped: a title with "<" or "'" must not
+    # break (or inject into) the card markup.
+    esc = html.escape
+    title = esc(soa["names"][i])
+    artist = esc(soa["artists"][i])
+    album = esc(soa["albums"][i])
+    image_url = esc(soa["artworks"][i])
+
+    preview = esc(soa["previews"][i] or "")
+    link = esc(soa["links"][i] or "")
+    metrics = soa["metrics"][i]
+
+    image_tag = f'<img src="{image_url}" width="60" height="60" loading="lazy" decoding="async" style="border-radius: 8px;">' if image_url else ''
+    metrics_html = f"<div style='font-size: 0.8rem; color: #c7d0e3;'>{metrics}</div>" if metrics else ''
+    link_html = f"<a href='{link}' target='_blank' style='text-decoration: none; color: #FA2D48; font-weight: bold;'>🎵 Open in Apple Music</a>" if link else ''
+    # preload="none": the browser fetches nothing until the user presses play.
+    audio_html = f"<audio controls preload='none' src='{preview}' style='width: 100%; margin-top: 6px;'></audio>" if preview else ''
+
+    # ALL ON ONE LINE to prevent "Black Box" code blocks
+    return f"<div class='card' style='display: flex; align-items: center; gap: 15px; margin-bottom: 10px; padding: 10px; border-radius: 10px; background-color: rgba(102, 126, 234, 0.3); border: 1px solid rgba(102, 126, 234, 0.3); color: #e5e7ff;'>{image_tag}<div style='flex-grow: 1;'><div style='font-size: 1.1rem; font-weight: 700; color: #ffffff;'>{title}</div><div style='font-size: 0.95rem; color: #e5e7ff;'>{artist}</div><div style='font-size: 0.8rem; color: #c7d0e3;'>{album}</div>{metrics_html}{link_html}{audio_html}</div></div>"
+
+
+def _reset_selection(keep: bool):
+    """
+    SELECT ALL / CLEAR ALL: reset the editor baseline. Bumping the revision
+    gives the editor a fresh key so stale per-row edits are dropped.
+    """
+    st.session_state.keep_all = keep
+    st.session_state.editor_rev += 1
+
+
+def _load_more():
+    st.session_state.rec_page += 1
+
+
+# A fragment: editor toggles and LOAD MORE rerun only this block, not the
+# vibe controls, recommend button and playlist form around it.
+@st.fragment
+def tracks_table():
+    soa = st.session_state.tracks_soa
+    if not soa or not soa["ids"]:
+        st.info("🎵 No tracks yet. Click **RECOMMEND TRACKS** above.")
+        return
+
+    st.subheader("3) Review & pick tracks")
+    st.caption(
+        "Uncheck any songs you don't want in the playlist. You can preview each one (Apple preview audio) if available."
+    )
+
+    c1, c2, _ = st.columns([0.2, 0.2, 0.6])
+    with c1:
+        st.button("✅ SELECT ALL", key="btn_select_all", on_click=_reset_selection, args=(True,))
+    with c2:
+        st.button("❌ CLEAR ALL", key="btn_clear_all", on_click=_reset_selection, args=(False,))
+
+    # One data_editor carries every keep/drop toggle as a single diff, instead
+    # of one checkbox widget (and one full rerun) per track.
+    ids = soa["ids"]
+    table = pd.DataFrame(
+        {
+            "keep": [st.session_state.keep_all] * len(ids),
+            "title": soa["names"],
+            "artist": soa["artists"],
+        }
+    )
+    editor_key = f"tracks_editor_{st.session_state.editor_rev}"
+    st.data_editor(
+        table,
+        key=editor_key,
+        hide_index=True,
+        use_container_width=True,
+        disabled=["title", "artist"],
+        column_config={
+            "keep": st.column_config.CheckboxColumn("Keep", default=True),
+            "title": st.column_config.TextColumn("Title"),
+            "artist": st.column_config.TextColumn("Artist"),
+        },
+    )
+
+    # Apply only the editor's diff ({row: {"keep": bool}}) to the baseline,
+    # rather than copying and masking the whole edited DataFrame. The list is
+    # fixed once recommended, so a positional mask is all the state we need.
+    mask = np.full(len(ids), st.session_state.keep_all, dtype=bool)
+    for row, change in st.session_state[editor_key]["edited_rows"].items():
+        if "keep" in change:
+            mask[int(row)] = change["keep"]
+    # Publish once, as an immutable snapshot for create_playlist_block.
+    mask.setflags(write=False)
+    st.session_state.sel_mask = mask
+
+    # Only the first pages of cards are rendered; the rest wait for "Load more".
+    shown = TRACKS_PAGE_SIZE * st.session_state.rec_page
+    # All cards on the page, audio players included, go out as one element.
+    # The preconnect hints cover every result's artwork host, so lazy images
+    # further down (and "Load more" pages) find their connection already open.
+    st.markdown(soa["preconnect"] + "".join(soa["cards"][:shown]), unsafe_allow_html=True)
+
+    if len(ids) > shown:
+        st.button(f"⬇️ LOAD MORE ({len(ids) - shown} left)", key="btn_load_more", on_click=_load_more)
+
+
+def create_playlist_block(vibe: str):
+    st.subheader("4) Create Apple Music playlist (in your library)")
+
+    default_name = f"{vibe.capitalize()} • {time.strftime('%b %d, %Y')}"
+    name = st.text_input("Playlist name", value=default_name)
+    description = st.text_area(
+        "Description (optional)",
+        value=f"Task-based {vibe} playlist generated by Stanza.",
+    )
+
+    colA, colB = st.columns(2)
+    with colA:
+        use_all = st.toggle("Use all recommended tracks", value=True)
+    with colB:
+        st.caption("If off, only tracks you left checked above will be used.")
+
+    # --- 👇 NEW LOGIC STARTS HERE 👇 ---
+    
+    # 1. Create a placeholder slot for the action button
+    action_button_slot = st.empty()
+    
+    # 2. Render the 'Create' button inside that slot
+    create = action_button_slot.button("🪄 CREATE APPLE MUSIC PLAYLIST", type="primary", use_container_width=True)
+
+    if not create:
+        return
+
+    # Determine which tracks to use
+    if use_all:
+        soa = st.session_state.tracks_soa or {"ids": []}
+        track_ids = [tid for tid in soa["ids"] if tid]
+    else:
+        soa = st.session_state.tracks_soa or {"ids": []}
+        mask = st.session_state.sel_mask
+        # Kept tracks in ranked order (a set would lose it)
+        track_ids = [soa["ids"][i] for i in np.flatnonzero(mask) if soa["ids"][i]]
+
+    if not track_ids:
+        st.warning("⚠️ No tracks to include. Please recommend tracks and/or select at least one.")
+        return
+
+    user_token = st.session_state.apple_user_token.strip()
+    if not user_token:
+        st.error("❌ Apple Music user token is required. Please login above.")
+        return
+
+    # A second click on the same playlist (double-click, or clicking again
+    # after it succeeded) would create a duplicate in the user's library.
+    request_key = (name, tuple(track_ids))
+    last = st.session_state.last_playlist
+    if last is not None and last[0] == request_key:
+        st.info("ℹ️ This playlist was already created.")
+        if last[2]:
+            action_button_slot.link_button(
+                label="🎵 OPEN IN APPLE MUSIC", url=last[2], type="primary", use_container_width=True
+            )
+        return
+
+    payload = {
+        "user_token": user_token,
+        "storefront": "us",
+        "vibe": vibe,
+        "name": name,
+        "description": description,
+        "track_ids": track_ids,
+    }
+
+    with st.spinner("🎧 Creating your Apple Music playlist..."):
+        try:
+            # Call Backend
+            res = api_post("/apple/playlist", payload)
+            
+            playlist_id = res.get("playlist_id")
+            playlist_url = res.get("playlist_url")
+            st.session_state.last_playlist = (request_key, playlist_id, playlist_url)
+
+            # Success Feedback
+            st.success("✅ Playlist created in your Apple Music library!")
+            
+            # --- 3. SWAP THE BUTTON ---
+            if playlist_url:
+                # We overwrite the original 'create' button slot with the 'Open' link button
+                action_button_slot.link_button(
+                    label="🎵 OPEN IN APPLE MUSIC", 
+                    url=playlist_url, 
+                    type="primary", 
+                    use_container_width=True
+                )
+            
+            if playlist_id:
+                st.caption(f"Playlist ID: {playlist_id}")
+
+        except Exception as e:
+            st.error(f"❌ Playlist creation failed: {e}")
+
+def debug_panel():
+    """Sidebar view of recent backend calls and cache misses (enabled by STANZA_DEBUG=1)."""
+    with st.sidebar.expander("🔍 Debug: backend calls"):
+        misses = _cache_misses()
+        st.caption(
+            " • ".join(f"{name}: {n} backend fetches" for name, n in misses.items())
+            or "No backend fetches yet."
+        )
+        log = list(_api_log())
+        if log:
+            st.dataframe(pd.DataFrame(log[::-1]), hide_index=True, use_container_width=True)
+
+# ------------------ Main App ------------------
+def _logout():
+    # As a callback the token is gone before the rerun starts, so the login
+    # screen renders directly instead of via an extra st.rerun() pass.
+    st.session_state.apple_user_token = ""
+
+
+def main_app():
+    """
+    The actual application, only visible after login.
+    """
+    init_state()
+
+    # First render: fetch /vibes and read the logo in parallel instead of
+    # one after the other.
+    if "init_future" not in st.session_state:
+        _vibes_future()
+        _ui_executor().submit(logo_svg)
+
+    # 1. Mini Header (Logo + Logout)
+    c1, c2 = st.columns([0.8, 0.2])
+    with c1:
+        st.image(logo_svg(), width=150)
+    with c2:
+        st.button("🚪 Logout", type="secondary", use_container_width=True, on_click=_logout)
+            
+    st.divider()
+
+    # 2. Your Existing Logic
+    # (These are the functions you already wrote)
+    vibe, limit = vibe_controls()
+    recommend_action(vibe, limit)
+    tracks_table()
+    create_playlist_block(vibe)
+
+    if DEBUG_PANEL:
+        debug_panel()
@@ -0,0 +1,57 @@
+"""
+Shared frontend settings — STANZA
+=================================
+Used by both the login screen (streamlitFrontEnd.py) and the recommendation
+app (frontend_app.py). Deliberately light on imports so the login page can use
+it without pulling in the app's HTTP and pandas stack.
+
+Configuration:
+--------------
+Read from `.streamlit/secrets.toml` (loaded once by Streamlit at boot), falling
+back to environment variables for local dev:
+
+    BACKEND_BASE_URL = "https://maia-entertainment-spring-25.onrender.com"
+    STANZA_DEBUG = "1"   # optional: sidebar panel with backend call timings
+"""
+
+import os
+import re
+
+import streamlit as st
+
+
+def _setting(name: str, default: str) -> str:
+    """st.secrets first, then the environment (local dev without secrets.toml)."""
+    try:
+        value = st.secrets.get(name)
+    except FileNotFoundError:
+        value = None
+    return value or os.getenv(name, default)
+
+
+# Imported modules (unlike the main script) execute once per process.
+BACKEND_BASE_URL = _setting(
+    "BACKEND_BASE_URL",
+    "https://maia-entertainment-spring-25.onrender.com"
+).rstrip("/")
+DEBUG_PANEL = _setting("STANZA_DEBUG", "") == "1"
+
+
+@st.cache_resource(show_spinner=False)
+def logo_svg() -> str:
+    """The Stanza logo as SVG markup, read from disk once per process."""
+    with open("stanzavector.svg", encoding="utf-8") as f:
+        return f.read()
+
+
+@st.cache_resource(show_spinner=False)
+def page_css() -> str:
+    """
+    stanza.css as a minified <style> tag, read once per process. Inlined
+    rather than linked from static/: Streamlit serves static files as
+    text/plain with nosniff, which browsers won't apply as a stylesheet.
+    """
+    with open("stanza.css", encoding="utf-8") as f:
+        css = f.read()
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    return "<style>" + re.sub(r"\s*\n\s*", "", css).strip() + "</style>"
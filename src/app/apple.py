@@ -3,17 +3,21 @@
 import os
 import time
 import math
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 
-from dotenv import load_dotenv
 import httpx
 
+# Local dev: pick up a .env if there is one (before apple_music reads its
+# keys at import). Deployed, the platform injects the variables, so there is
+# no file to read and dotenv is never imported.
+if os.path.exists(".env"):
+    from dotenv import load_dotenv
+    load_dotenv()
+
 from .audio_features import extract_features_from_url
 from .student_tracks import get_reference_features_for_vibe
 from .apple_music import generate_developer_token
 
-# Load env variables no
-
 APPLE_DEVELOPER_TOKEN = os.getenv("APPLE_DEVELOPER_TOKEN")
 
 # If not in Env, generate it automatically!
@@ -136,28 +140,19 @@ def cosine_similarity(vec_a: Dict[str, float], vec_b: Dict[str, float]) -> float
     return dot / math.sqrt(norm_a * norm_b)
 
 
-def recommend_tracks_for_vibe(
-    vibe: str,
-    storefront: str,
-    limit: int = 25,
-) -> List[Dict[str, Any]]:
+def iter_scored_tracks_for_vibe(vibe: str, storefront: str) -> Iterator[Dict[str, Any]]:
     """
-    Core Apple Music recommendation logic:
-
-    1. Get the reference feature vector for this vibe from student tracks.
-    2. Search Apple Music for candidate tracks.
-    3. For each track, try to extract audio features from its preview.
-    4. Rank tracks by cosine similarity to the vibe reference.
-    5. Return top-N with preview URLs + similarity scores.
+    Yield each Apple Music candidate for a vibe as soon as its preview has been
+    analyzed and scored, in search order (not ranked). Used directly by the
+    streaming endpoint and ranked by recommend_tracks_for_vibe.
     """
     ref_features = get_reference_features_for_vibe(vibe)
     if not ref_features:
         print(f"[AppleMusic] No reference features for vibe '{vibe}'")
-        return []
+        return
 
     raw_candidates = search_tracks_for_vibe(vibe, storefront=storefront, limit=25)
 
-    scored_tracks: List[Dict[str, Any]] = []
     for track in raw_candidates:
         feats = extract_preview_features_for_track(track)
         if not feats:
@@ -174,22 +169,41 @@ def recommend_tracks_for_vibe(
         attrs = track.get("attributes", {})
         # Safe Artwork Extraction
         artwork = attrs.get("artwork", {})
-        # Replace placeholders with 100x100 dimensions
-        artwork_url = artwork.get("url", "").replace("{w}", "100").replace("{h}", "100")
-
-        scored_tracks.append(
-            {
-                "id": track.get("id"),
-                "name": attrs.get("name"),
-                "artist_name": attrs.get("artistName"),
-                "album_name": attrs.get("albumName"),
-                "artwork_url": artwork_url,
-                "preview_url": feats.get("preview_url"),
-                "apple_music_url": attrs.get("url"),
-                "features": feature_vector,
-                "similarity": score,
-            }
-        )
+        # Fill the size template with 120x120: 2x the 60px card thumbnail, so
+        # it stays sharp on retina screens without shipping a full-size image
+        artwork_url = artwork.get("url", "").replace("{w}", "120").replace("{h}", "120")
+        # The CDN renders any format the name asks for; WebP is a fraction of the JPEG
+        if artwork_url.endswith("bb.jpg"):
+            artwork_url = artwork_url[: -len("jpg")] + "webp"
+
+        yield {
+            "id": track.get("id"),
+            "name": attrs.get("name"),
+            "artist_name": attrs.get("artistName"),
+            "album_name": attrs.get("albumName"),
+            "artwork_url": artwork_url,
+            "preview_url": feats.get("preview_url"),
+            "apple_music_url": attrs.get("url"),
+            "features": feature_vector,
+            "similarity": score,
+        }
+
+
+def recommend_tracks_for_vibe(
+    vibe: str,
+    storefront: str,
+    limit: int = 25,
+) -> List[Dict[str, Any]]:
+    """
+    Core Apple Music recommendation logic:
+
+    1. Get the reference feature vector for this vibe from student tracks.
+    2. Search Apple Music for candidate tracks.
+    3. For each track, try to extract audio features from its preview.
+    4. Rank tracks by cosine similarity to the vibe reference.
+    5. Return top-N with preview URLs + similarity scores.
+    """
+    scored_tracks = list(iter_scored_tracks_for_vibe(vibe, storefront))
 
     # Sort by similarity descending
     scored_tracks.sort(key=lambda t: t["similarity"], reverse=True)
@@ -213,13 +227,19 @@ def create_library_playlist(
     if not track_ids:
         return None
 
-    # 1) Create playlist
+    # Create the playlist with its tracks in a single request: Apple accepts the
+    # tracks relationship on creation, so no second "add tracks" round trip.
     url = f"{APPLE_MUSIC_BASE_URL}/v1/me/library/playlists"
     payload = {
         "attributes": {
             "name": name,
             "description": description,
-        }
+        },
+        "relationships": {
+            "tracks": {
+                "data": [{"id": tid, "type": "songs"} for tid in track_ids]
+            }
+        },
     }
 
     with httpx.Client(timeout=20.0) as client:
@@ -238,16 +258,6 @@ def create_library_playlist(
     if not playlist_id:
         return None
 
-    # 2) Add tracks to playlist
-    relationships_url = f"{APPLE_MUSIC_BASE_URL}/v1/me/library/playlists/{playlist_id}/tracks"
-    track_payload = {
-        "data": [{"id": tid, "type": "songs"} for tid in track_ids]
-    }
-
-    with httpx.Client(timeout=20.0) as client:
-        r = client.post(relationships_url, json=track_payload, headers=apple_auth_headers(user_token))
-        r.raise_for_status()
-
     # 👇 CHANGED: Return both pieces of data
     return {
         "id": playlist_id,
@@ -1,108 +1,157 @@
 # src/app/audio_features.py
+"""
+The one librosa feature extractor, used for both the student reference tracks
+(student_tracks.py) and the Apple Music previews they are compared against
+(apple.py), so both sides of the cosine similarity share one schema.
+"""
 
+from __future__ import annotations
+
+import atexit
 import io
-import math
-import tempfile
 import os
-from typing import Dict, Any, Optional
+import tempfile
+from typing import Dict, Optional
 
 import httpx
 import numpy as np
 import librosa
 
 
-def _estimate_energy(y: np.ndarray) -> float:
-    """
-    Crude 'energy' estimate: log-scaled RMS in [0, 1].
-    """
-    rms = float(librosa.feature.rms(y=y).mean())
-    val = math.log10(1.0 + 9.0 * rms)  # 0 → 0, higher RMS → closer to 1
-    return float(min(1.0, max(0.0, val)))
-
-
-def _estimate_valence_like(y: np.ndarray, sr: int) -> float:
+# Order of the feature vector
+FEATURE_KEYS = ("tempo", "energy", "zcr", "centroid", "bandwidth")
+
+# Analysis settings: 16 kHz keeps everything up to 8 kHz, which covers the
+# features we compute, and previews/choruses fit in the first 30 s.
+ANALYSIS_SR = 16000
+ANALYSIS_SECONDS = 30.0
+N_FFT = 1024
+HOP_LENGTH = 512
+
+# PyAV (libav bindings) decodes AAC/M4A straight from memory; without it
+# we fall back to a temp file + librosa's audioread/ffmpeg subprocess path.
+try:
+    import av
+except ImportError:
+    av = None
+
+# One shared client so repeat downloads from the same host reuse the
+# connection instead of a fresh DNS + TCP + TLS setup per track.
+try:
+    import h2  # noqa: F401  (optional; enables HTTP/2 multiplexing)
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+HTTP_CLIENT = httpx.Client(
+    timeout=30.0,
+    http2=_HTTP2,
+    limits=httpx.Limits(max_keepalive_connections=8),
+)
+atexit.register(HTTP_CLIENT.close)
+
+
+def _decode_with_av(data: bytes, sr: int) -> np.ndarray:
+    """Decode (and resample, via libswresample) the first ANALYSIS_SECONDS to mono float32."""
+    limit = int(sr * ANALYSIS_SECONDS)
+    chunks = []
+    n = 0
+    with av.open(io.BytesIO(data)) as container:
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sr)
+        for frame in container.decode(audio=0):
+            for out in resampler.resample(frame):
+                chunk = out.to_ndarray().reshape(-1)
+                chunks.append(chunk)
+                n += chunk.size
+            if n >= limit:
+                break
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks)[:limit]
+
+
+def _load_audio(data: bytes, sr: int) -> np.ndarray:
     """
-    Rough 'valence-like' proxy using spectral centroid:
-    brighter sounds → higher centroid → more 'positive'.
+    Decode the first ANALYSIS_SECONDS of audio to mono at `sr`.
+    MP3/WAV/FLAC decode straight from memory via soundfile (libsndfile).
+    Formats it can't read (Apple's AAC .m4a previews) go through PyAV when
+    installed, else a temp file for librosa's audioread path.
     """
-    cent = float(librosa.feature.spectral_centroid(y=y, sr=sr).mean())
-    return float(min(1.0, max(0.0, cent / 8000.0)))
+    try:
+        y, _ = librosa.load(
+            io.BytesIO(data), sr=sr, mono=True, duration=ANALYSIS_SECONDS, res_type="soxr_hq"
+        )
+        return y
+    except Exception:
+        pass
 
+    if av is not None:
+        return _decode_with_av(data, sr)
 
-def _estimate_acousticness_like(y: np.ndarray, sr: int) -> float:
-    """
-    Crude acousticness proxy: invert spectral rolloff.
-    More high-frequency content → less 'acoustic'.
-    """
-    rolloff = float(librosa.feature.spectral_rolloff(y=y, sr=sr).mean())
-    nyquist = sr / 2.0
-    norm = min(1.0, max(0.0, rolloff / nyquist))
-    return float(1.0 - norm)
+    with tempfile.NamedTemporaryFile(suffix=".m4a", delete=False) as tmp_file:
+        tmp_file.write(data)
+        tmp_file_path = tmp_file.name
+    try:
+        y, _ = librosa.load(tmp_file_path, sr=sr, mono=True, duration=ANALYSIS_SECONDS)
+        return y
+    finally:
+        os.remove(tmp_file_path)
 
 
-def _estimate_danceability_like(y: np.ndarray, sr: int) -> float:
+def extract_features_from_audio_bytes(data: bytes, sr: int = ANALYSIS_SR) -> Dict[str, float]:
     """
-    Rough danceability proxy based on tempo + onset strength.
+    Given raw audio bytes (e.g. from an MP3 preview), compute a
+    small, consistent feature vector.
+
+    We keep it simple & fast:
+      - tempo (BPM)
+      - energy (mean RMS)
+      - zcr (mean zero-crossing rate)
+      - centroid (mean spectral centroid)
+      - bandwidth (mean spectral bandwidth)
+
+    Only the first ANALYSIS_SECONDS are decoded, at 16 kHz, and one magnitude
+    spectrogram is shared by the RMS / centroid / bandwidth passes.
     """
-    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    beat_strength = float(onset_env.mean())
-
-    # normalize tempo between 60 and 180 BPM
-    tempo_norm = (tempo - 60.0) / (180.0 - 60.0)
-    tempo_norm = float(min(1.0, max(0.0, tempo_norm)))
+    y = _load_audio(data, sr)
 
-    # normalize beat strength with a heuristic divisor
-    strength_norm = float(min(1.0, max(0.0, beat_strength / 10.0)))
+    if y.size == 0:
+        raise ValueError("Empty audio signal")
+    # Under a second (truncated / near-empty previews) gives a meaningless
+    # tempo and spectral means; better unscored than ranked.
+    if y.size < sr:
+        raise ValueError("Audio too short")
 
-    return 0.6 * tempo_norm + 0.4 * strength_norm
+    # Tempo
+    tempo, _ = librosa.beat.beat_track(y=y, sr=sr, hop_length=HOP_LENGTH)
 
+    # One STFT for all the spectral features
+    S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
 
-def extract_features_from_audio_bytes(audio_bytes: bytes, sr: int = 22050) -> Optional[Dict[str, Any]]:
-    """
-    Decode raw audio bytes (MP3/M4A/etc.) and extract a feature dict.
-    Updated to use a temporary file to support M4A/AAC decoding.
-    """
-    # Create a temporary file to hold the audio data
-    # We use a suffix like .m4a so librosa knows what format to expect
-    with tempfile.NamedTemporaryFile(suffix=".m4a", delete=False) as tmp_file:
-        tmp_file.write(audio_bytes)
-        tmp_file_path = tmp_file.name
+    # RMS energy
+    rms = librosa.feature.rms(S=S, frame_length=N_FFT, hop_length=HOP_LENGTH)
+    energy = float(np.mean(rms))
 
-    try:
-        # Load from the FILE PATH, not the memory buffer
-        y, sr = librosa.load(tmp_file_path, sr=sr, mono=True)
-    except Exception as e:
-        print("Failed to decode audio bytes:", repr(e))
-        return None
-    finally:
-        # Clean up: remove the temp file to save space
-        if os.path.exists(tmp_file_path):
-            os.remove(tmp_file_path)
-
-    if y.size < sr:
-        return None
+    # Zero-crossing rate
+    zcr = librosa.feature.zero_crossing_rate(y=y, frame_length=N_FFT, hop_length=HOP_LENGTH)
+    zcr_mean = float(np.mean(zcr))
 
-    # ... (Keep the rest of your feature extraction logic below) ...
-    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-    energy = _estimate_energy(y)
-    valence = _estimate_valence_like(y, sr)
-    acousticness = _estimate_acousticness_like(y, sr)
-    danceability = _estimate_danceability_like(y, sr)
-    
-    instrumentalness = 0.0
+    # Spectral centroid & bandwidth
+    centroid = librosa.feature.spectral_centroid(S=S, sr=sr)
+    bandwidth = librosa.feature.spectral_bandwidth(S=S, sr=sr)
+    centroid_mean = float(np.mean(centroid))
+    bandwidth_mean = float(np.mean(bandwidth))
 
     return {
         "tempo": float(tempo),
-        "energy": float(energy),
-        "valence": float(valence),
-        "acousticness": float(acousticness),
-        "danceability": float(danceability),
-        "instrumentalness": float(instrumentalness),
+        "energy": energy,
+        "zcr": zcr_mean,
+        "centroid": centroid_mean,
+        "bandwidth": bandwidth_mean,
     }
 
 
-def extract_features_from_url(url: str) -> Optional[Dict[str, Any]]:
+def extract_features_from_url(url: str) -> Optional[Dict[str, float]]:
     """
     Download audio from a URL, then extract features.
     """
@@ -110,12 +159,15 @@ def extract_features_from_url(url: str) -> Optional[Dict[str, Any]]:
         return None
 
     try:
-        with httpx.Client(timeout=30.0) as client:
-            r = client.get(url)
-            r.raise_for_status()
-            audio_bytes = r.content
+        r = HTTP_CLIENT.get(url)
+        r.raise_for_status()
+        audio_bytes = r.content
     except Exception as e:
         print("Failed to download audio from URL:", url, "error:", repr(e))
         return None
 
-    return extract_features_from_audio_bytes(audio_bytes)
+    try:
+        return extract_features_from_audio_bytes(audio_bytes)
+    except Exception as e:
+        print("Failed to analyze audio from URL:", url, "error:", repr(e))
+        return None
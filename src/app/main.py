@@ -1,16 +1,19 @@
 # src/app/main.py
+import hashlib
+import json
 import os
 from typing import List, Optional, Dict, Any
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 
 # Apple logic lives here:
-from .apple import recommend_tracks_for_vibe, create_library_playlist
+from .apple import recommend_tracks_for_vibe, iter_scored_tracks_for_vibe, create_library_playlist
 from .student_tracks import list_vibes  # your existing student_vibes/student_tracks helper
 from src.app.apple_music import generate_developer_token
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from src.app.apple_music import generate_developer_token
 
 # ---------- Create app ----------
@@ -27,6 +30,24 @@ app.add_middleware(
 )
 
 
+
+class _GZipExceptStreams(GZipMiddleware):
+    """
+    Gzip JSON responses (the recommend payload compresses several-fold), but
+    leave the NDJSON /stream routes alone: the gzip buffer would hold lines
+    back until it fills, defeating the point of streaming them.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+app.add_middleware(_GZipExceptStreams, minimum_size=1000)
+
+
 # ---------- Simple root + health ----------
 
 @app.get("/")
@@ -42,12 +63,16 @@ def health():
 # ---------- Vibes catalog ----------
 
 @app.get("/vibes")
-def get_vibes():
+def get_vibes(request: Request):
     """
     Return the set of vibes for which we have student tracks.
+    Sends an ETag so clients can revalidate with If-None-Match and get a 304.
     """
-    vibes = list_vibes()
-    return {"vibes": vibes}
+    body = {"vibes": list_vibes()}
+    etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content=body, headers={"ETag": etag})
 
 @app.get("/apple/token")
 def get_apple_token():
@@ -219,6 +244,24 @@ def apple_recommend(body: AppleRecommendIn):
     return AppleRecommendOut(ok=True, vibe=body.vibe, count=len(out_tracks), tracks=out_tracks)
 
 
+@app.post("/apple/recommend/stream")
+def apple_recommend_stream(body: AppleRecommendIn):
+    """
+    Same inputs as /apple/recommend, but streamed as NDJSON: one scored track
+    per line as soon as its preview is analyzed (unranked), so clients can
+    show progress instead of waiting for the whole batch. Clients rank by
+    "similarity" and keep the top `limit` themselves.
+    """
+    if body.limit <= 0:
+        raise HTTPException(status_code=400, detail="limit must be > 0")
+
+    def lines():
+        for t in iter_scored_tracks_for_vibe(vibe=body.vibe, storefront=body.storefront):
+            yield json.dumps(t) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 # ---------- Apple Music playlist creation ----------
 
 @app.post("/apple/playlist", response_model=ApplePlaylistOut)
@@ -2,13 +2,25 @@
 
 from __future__ import annotations
 
-import io
+import hashlib
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import List, Dict, Any, Optional, Set
 
-import httpx
 import numpy as np
-import librosa
+
+from .audio_features import (
+    ANALYSIS_SECONDS,
+    ANALYSIS_SR,
+    FEATURE_KEYS,
+    HOP_LENGTH,
+    HTTP_CLIENT,
+    N_FFT,
+    extract_features_from_audio_bytes,
+)
 
 
 # -------------------------------------------------------------------
@@ -42,6 +54,16 @@ STUDENT_TRACKS: List[Dict[str, Any]] = [
 
 # Cache so we don't re-download & re-analyze the same student track
 _STUDENT_FEATURE_CACHE: Dict[str, Dict[str, float]] = {}
+_STUDENT_FEATURE_CACHE_LOCK = threading.Lock()
+
+# On-disk cache so features survive process restarts (new dyno, redeploy).
+# The in-memory dict above stays as the hot layer on top of it.
+FEATURE_CACHE_DIR = Path(
+    os.getenv("STANZA_FEATURE_CACHE_DIR", Path.home() / ".cache" / "stanza" / "features")
+)
+
+# Downloads are I/O-bound, so a vibe's tracks are fetched/analyzed in parallel
+MAX_FEATURE_WORKERS = 8
 
 
 # -------------------------------------------------------------------
@@ -68,70 +90,79 @@ def get_student_tracks_for_vibe(vibe: str) -> List[Dict[str, Any]]:
 
 
 # -------------------------------------------------------------------
-# 3) Audio feature extraction (librosa) for *both* student and Apple tracks
+# 3) Student track features (extraction itself lives in audio_features.py)
 # -------------------------------------------------------------------
-def extract_features_from_audio_bytes(data: bytes, sr: int = 22050) -> Dict[str, float]:
-    """
-    Given raw audio bytes (e.g. from an MP3 preview), compute a
-    small, consistent feature vector.
-
-    We keep it simple & fast:
-      - tempo (BPM)
-      - energy (mean RMS)
-      - zcr (mean zero-crossing rate)
-      - centroid (mean spectral centroid)
-      - bandwidth (mean spectral bandwidth)
-    """
-    # librosa can read from a file-like object
-    audio_buffer = io.BytesIO(data)
-    y, sr = librosa.load(audio_buffer, sr=sr, mono=True)
+def _feature_cache_path(track_id: str, audio_url: str) -> Path:
+    # Keyed on the URL and analysis settings too, so a re-uploaded file or a
+    # change to the extraction parameters doesn't serve stale features.
+    key = f"{audio_url}|{ANALYSIS_SR}|{ANALYSIS_SECONDS}|{N_FFT}|{HOP_LENGTH}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in track_id)
+    return FEATURE_CACHE_DIR / f"{safe_id}-{digest}.json"
 
-    if y.size == 0:
-        raise ValueError("Empty audio signal")
 
-    # Tempo
-    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-
-    # RMS energy
-    rms = librosa.feature.rms(y=y)
-    energy = float(np.mean(rms))
-
-    # Zero-crossing rate
-    zcr = librosa.feature.zero_crossing_rate(y=y)
-    zcr_mean = float(np.mean(zcr))
+def _load_cached_features(path: Path) -> Optional[Dict[str, float]]:
+    """
+    The cached features at `path`, or None (a cache miss, so the caller
+    re-extracts and rewrites the file) if it's missing, truncated, or not
+    exactly FEATURE_KEYS with finite numeric values (e.g. an older schema).
+    """
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            feats = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(feats, dict)
+        or set(feats) != set(FEATURE_KEYS)
+        or not all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) and np.isfinite(v)
+            for v in feats.values()
+        )
+    ):
+        print(f"[StudentFeatures] Ignoring invalid feature cache {path}")
+        return None
+    return feats
 
-    # Spectral centroid & bandwidth
-    centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
-    bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)
-    centroid_mean = float(np.mean(centroid))
-    bandwidth_mean = float(np.mean(bandwidth))
 
-    return {
-        "tempo": float(tempo),
-        "energy": energy,
-        "zcr": zcr_mean,
-        "centroid": centroid_mean,
-        "bandwidth": bandwidth_mean,
-    }
+def _store_cached_features(path: Path, feats: Dict[str, float]) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial file
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(feats, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[StudentFeatures] Could not write feature cache {path}: {e}")
 
 
 def get_features_for_student_track(track_id: str, audio_url: str) -> Optional[Dict[str, float]]:
     """
-    Download & analyze a single student track, with caching.
+    Download & analyze a single student track, with caching
+    (memory first, then disk, then download + librosa).
     """
     if track_id in _STUDENT_FEATURE_CACHE:
         return _STUDENT_FEATURE_CACHE[track_id]
 
+    cache_path = _feature_cache_path(track_id, audio_url)
+    feats = _load_cached_features(cache_path)
+    if feats is not None:
+        with _STUDENT_FEATURE_CACHE_LOCK:
+            _STUDENT_FEATURE_CACHE[track_id] = feats
+        return feats
+
     try:
-        with httpx.Client(timeout=30.0) as client:
-            r = client.get(audio_url)
-            r.raise_for_status()
-            feats = extract_features_from_audio_bytes(r.content)
+        r = HTTP_CLIENT.get(audio_url)
+        r.raise_for_status()
+        feats = extract_features_from_audio_bytes(r.content)
     except Exception as e:
         print(f"[StudentFeatures] Failed to fetch/analyze {track_id} from {audio_url}: {e}")
         return None
 
-    _STUDENT_FEATURE_CACHE[track_id] = feats
+    _store_cached_features(cache_path, feats)
+    with _STUDENT_FEATURE_CACHE_LOCK:
+        _STUDENT_FEATURE_CACHE[track_id] = feats
     return feats
 
 
@@ -148,22 +179,42 @@ def get_reference_features_for_vibe(vibe: str) -> Optional[Dict[str, float]]:
         print(f"[StudentFeatures] No student tracks for vibe '{vibe}'")
         return None
 
-    feature_list: List[Dict[str, float]] = []
-    for t in candidates:
-        feats = get_features_for_student_track(t["id"], t["audio_url"])
-        if feats:
-            feature_list.append(feats)
+    workers = min(MAX_FEATURE_WORKERS, len(candidates))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(
+            pool.map(lambda t: get_features_for_student_track(t["id"], t["audio_url"]), candidates)
+        )
+    feature_list: List[Dict[str, float]] = [f for f in results if f]
 
     if not feature_list:
         print(f"[StudentFeatures] No valid features for vibe '{vibe}'")
         return None
 
-    keys = ["tempo", "energy", "zcr", "centroid", "bandwidth"]
-    avg: Dict[str, float] = {}
-    n = len(feature_list)
-    for k in keys:
-        s = sum(float(f.get(k, 0.0)) for f in feature_list)
-        avg[k] = s / n
+    n, k = len(feature_list), len(FEATURE_KEYS)
+    arr = np.fromiter(
+        (f.get(key, 0.0) for f in feature_list for key in FEATURE_KEYS),
+        dtype=np.float64,
+        count=n * k,
+    ).reshape(n, k)
+    avg: Dict[str, float] = dict(zip(FEATURE_KEYS, arr.mean(axis=0).tolist()))
 
     print(f"[StudentFeatures] Reference vector for vibe '{vibe}': {avg}")
     return avg
+
+
+# -------------------------------------------------------------------
+# 5) Optional cache warm-up
+# -------------------------------------------------------------------
+def _warm_feature_cache() -> None:
+    """Analyze every known student track so the first /recommend hits a warm cache."""
+    for vibe in list_vibes():
+        try:
+            get_reference_features_for_vibe(vibe)
+        except Exception as e:
+            print(f"[StudentFeatures] Warm-up failed for vibe '{vibe}': {e}")
+
+
+# Opt-in (STANZA_WARM=1) so scripts and tests importing this module don't
+# start downloading audio.
+if os.getenv("STANZA_WARM") == "1":
+    threading.Thread(target=_warm_feature_cache, name="student-features-warm", daemon=True).start()
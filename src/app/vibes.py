@@ -1,9 +1,12 @@
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Any, Mapping, Tuple
 
 # Target feature ranges/centers tuned for accuracy.
 # We’ll send these as target_* to Spotify’s recommendations
 # and then do a secondary score-based sort.
-VIBE_FEATURES: Dict[str, Dict[str, Any]] = {
+# Read-only (MappingProxyType) so they can be shared across threads and
+# passed straight through as keyword arguments without defensive copies.
+_VIBE_FEATURES = {
     "mellow": {
         "target_energy": 0.25,
         "target_valence": 0.45,
@@ -47,18 +50,27 @@ VIBE_FEATURES: Dict[str, Dict[str, Any]] = {
         "target_danceability": 0.6
     },
 }
+VIBE_FEATURES: Mapping[str, Mapping[str, Any]] = MappingProxyType(
+    {vibe: MappingProxyType(feats) for vibe, feats in _VIBE_FEATURES.items()}
+)
 
 # Optional genre nudges (seed genres)
-VIBE_SEED_GENRES = {
-    "mellow": ["acoustic", "ambient", "folk"],
-    "energetic": ["dance", "edm", "house", "rock"],
-    "sad": ["piano", "singer-songwriter", "indie"],
-    "happy": ["pop", "funk", "dance"],
-    "focus": ["ambient", "study", "classical"],
-    "epic": ["rock", "electronic", "trance"]
-}
+VIBE_SEED_GENRES: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "mellow": ("acoustic", "ambient", "folk"),
+    "energetic": ("dance", "edm", "house", "rock"),
+    "sad": ("piano", "singer-songwriter", "indie"),
+    "happy": ("pop", "funk", "dance"),
+    "focus": ("ambient", "study", "classical"),
+    "epic": ("rock", "electronic", "trance"),
+})
+
+# (min, max) desired instrumentalness band, keyed by "lyrical".
+# If user wants non-lyrical: push instrumentalness high.
+# If lyrical: keep instrumentalness modest.
+_INSTRUMENTAL_BAND: Mapping[bool, Tuple[float, float]] = MappingProxyType({
+    True: (0.2, 0.5),
+    False: (0.8, 1.0),
+})
 
-def instrumental_filter_threshold(lyrical: bool):
-    # If user wants non-lyrical: push instrumentalness high.
-    # If lyrical: keep instrumentalness modest.
-    return (0.2, 0.5) if lyrical else (0.8, 1.0)  # (min,max) desired band
+def instrumental_filter_threshold(lyrical: bool) -> Tuple[float, float]:
+    return _INSTRUMENTAL_BAND[bool(lyrical)]